@@ -1,47 +1,87 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import lxml.html
+from lxml import etree
 import re
 import pandas as pd
 import phonenumbers
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from tqdm import tqdm
 import time
-import json
-from fastapi import FastAPI, Query
+import orjson
+import threading
+import socket
+from functools import lru_cache
+from fastapi import FastAPI, HTTPException, Query
 from typing import Optional
-from difflib import SequenceMatcher
+import numpy as np
+from rapidfuzz import fuzz, process
 
 SCRAPE_TIMEOUT = 7
 MAX_WORKERS = 32
 SCRAPE_CHUNK_SIZE = 100000
+TEXT_TYPES = {'text/html', 'application/xhtml+xml'}
 INPUT_WEBSITES_CSV = 'CSVs/sample-websites.csv'
 INPUT_COMPANY_NAMES_CSV = 'CSVs/sample-websites-company-names.csv'
 COMPANY_PROFILES_JSON = 'company_profiles.json'
+QUERY_FIELDS = ('name', 'domain', 'phone', 'facebook')
+NAME_FIELDS = ['company_commercial_name', 'company_legal_name', 'company_all_available_names', 'name', 'company_name']
 
-SOCIAL_PATTERNS = {
-    'facebook': re.compile(r'(https?://(?:www\.)?facebook\.com/[\w\-/\.]+)', re.I),
-    'twitter': re.compile(r'(https?://(?:www\.)?twitter\.com/[\w\-/\.]+)', re.I),
-    'linkedin': re.compile(r'(https?://(?:www\.)?linkedin\.com/[\w\-/\.]+)', re.I),
-    'instagram': re.compile(r'(https?://(?:www\.)?instagram\.com/[\w\-/\.]+)', re.I),
-}
+SOCIAL_NETWORKS = ('facebook', 'twitter', 'linkedin', 'instagram')
+SOCIAL_UNION = re.compile(r'https?://(?:www\.)?(?P<net>facebook|twitter|linkedin|instagram)\.com/[\w\-/\.]+', re.I)
+PHONE_CAND = re.compile(r'(?<!\d)(?:\+?1[-.\s]?)?\(?(?P<area>[2-9]\d{2})\)?[-.\s]?(?P<exchange>[2-9]\d{2})[-.\s]?(?P<line>\d{4})(?!\d)')
+ADDR_RE = re.compile(r'(address|location)', re.I)
 
+def warm_phone_metadata():
+    parsed = phonenumbers.parse("+12125550199", "US")
+    phonenumbers.is_valid_number(parsed)
+    phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164)
+
+warm_phone_metadata()
+
+local = threading.local()
+HOST_WORKING = {}
+
+def get_session():
+    session = getattr(local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS * 2, max_retries=Retry(total=0))
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        local.session = session
+    return session
+
+@lru_cache(maxsize=None)
 def clean_url(domain):
     d = str(domain).strip()
     if not d.startswith("http://") and not d.startswith("https://"):
         d = "https://" + d
     return d
 
-def extract_phone_numbers(html, soup):
+@lru_cache(maxsize=None)
+def normalize_domain(domain):
+    return str(domain).strip().removeprefix('http://').removeprefix('https://').strip('/')
+
+def extract_phone_numbers(html, soup, hrefs=None):
     phone_numbers = set()
-    for match in phonenumbers.PhoneNumberMatcher(html, "US"):
+    for m in PHONE_CAND.finditer(html):
+        area, exchange, line = m.group('area', 'exchange', 'line')
+        if area[1:] == '11' or exchange[1:] == '11':
+            continue
         try:
-            phone = phonenumbers.format_number(match.number, phonenumbers.PhoneNumberFormat.E164)
-            phone_numbers.add(phone)
+            parsed = phonenumbers.parse(area + exchange + line, "US")
+            if phonenumbers.is_valid_number(parsed):
+                phone_numbers.add(phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164))
         except Exception:
             continue
-    for a in soup.find_all('a', href=True):
-        if a['href'].startswith('tel:'):
-            num = a['href'][4:].strip()
+    if hrefs is None:
+        hrefs = [a['href'] for a in soup.find_all('a', href=True)]
+    for href in hrefs:
+        if href.startswith('tel:'):
+            num = href[4:].strip()
             try:
                 parsed = phonenumbers.parse(num, "US")
                 phone = phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164)
@@ -50,41 +90,74 @@ def extract_phone_numbers(html, soup):
                 pass
     return list(phone_numbers)
 
-def extract_social_links(html, soup):
-    socials = {k: [] for k in SOCIAL_PATTERNS}
-    for network, pattern in SOCIAL_PATTERNS.items():
-        socials[network].extend(pattern.findall(html))
-    for a in soup.find_all('a', href=True):
-        href = a['href']
-        for network, pattern in SOCIAL_PATTERNS.items():
-            if pattern.match(href):
-                socials[network].append(href)
-    for k in socials:
-        socials[k] = list(set(socials[k]))
-    return {k: v for k, v in socials.items() if v}
+def extract_social_links(html, soup, hrefs=None):
+    socials = {k: set() for k in SOCIAL_NETWORKS}
+    for m in SOCIAL_UNION.finditer(html):
+        socials[m.group('net').lower()].add(m.group(0))
+    if hrefs is None:
+        hrefs = [a['href'] for a in soup.find_all('a', href=True)]
+    for href in hrefs:
+        m = SOCIAL_UNION.match(href)
+        if m:
+            socials[m.group('net').lower()].add(href)
+    return {k: list(v) for k, v in socials.items() if v}
+
+def build_tree(html):
+    try:
+        return lxml.html.document_fromstring(html)
+    except ValueError:
+        return lxml.html.document_fromstring(html.encode('utf-8'), parser=lxml.html.HTMLParser(encoding='utf-8'))
+    except etree.ParserError:
+        return None
 
 def extract_address(soup):
-    footer = soup.find('footer')
-    if footer:
-        address_text = footer.get_text(separator=' ', strip=True)
+    tree = build_tree(str(soup))
+    return extract_address_tree(tree) if tree is not None else None
+
+def element_text(el):
+    return ' '.join(t.strip() for t in el.xpath('.//text()[not(ancestor::script or ancestor::style or ancestor::template)]') if t.strip())
+
+def extract_address_tree(tree):
+    footer = tree.find('.//footer')
+    if footer is not None:
+        address_text = element_text(footer)
         if 15 < len(address_text) < 250:
             return address_text
-    addr_tag = soup.find('address')
-    if addr_tag:
-        text = addr_tag.get_text(separator=' ', strip=True)
+    addr_tag = tree.find('.//address')
+    if addr_tag is not None:
+        text = element_text(addr_tag)
         if 10 < len(text) < 250:
             return text
-    for tag in soup.find_all(['div', 'span'], class_=re.compile(r'(address|location)', re.I)):
-        text = tag.get_text(separator=' ', strip=True)
-        if 10 < len(text) < 250:
-            return text
-    for tag in soup.find_all(['div', 'span'], id=re.compile(r'(address|location)', re.I)):
-        text = tag.get_text(separator=' ', strip=True)
+    id_hits = []
+    for tag in tree.iter('div', 'span'):
+        if ADDR_RE.search(tag.get('class') or ''):
+            text = element_text(tag)
+            if 10 < len(text) < 250:
+                return text
+        if ADDR_RE.search(tag.get('id') or ''):
+            id_hits.append(tag)
+    for tag in id_hits:
+        text = element_text(tag)
         if 10 < len(text) < 250:
             return text
     return None
 
-def scrape_site(domain):
+def read_html(resp):
+    raw = resp.raw.read(SCRAPE_CHUNK_SIZE, decode_content=True)
+    try:
+        return raw.decode(resp.encoding or 'utf-8', errors='replace')
+    except LookupError:
+        return raw.decode('utf-8', errors='replace')
+
+def parse_html(html):
+    tree = build_tree(html)
+    hrefs = tree.xpath('//a/@href') if tree is not None else []
+    phones = extract_phone_numbers(html, None, hrefs)
+    socials = extract_social_links(html, None, hrefs)
+    address = extract_address_tree(tree) if tree is not None else None
+    return phones, socials, address
+
+def scrape_site(domain, parse_pool=None):
     result = {
         'domain': domain,
         'phones': [],
@@ -99,31 +172,44 @@ def scrape_site(domain):
         'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Edge/90.0.818.56'
     ]
     urls_to_try = []
-    clean_domain = domain.replace('http://', '').replace('https://', '').strip('/')
+    clean_domain = normalize_domain(domain)
     for base in ['', 'www.']:
         urls_to_try.extend([
             f"https://{base}{clean_domain}",
             f"http://{base}{clean_domain}",
         ])
+    working_url = HOST_WORKING.get(clean_domain)
+    if working_url in urls_to_try:
+        urls_to_try.remove(working_url)
+        urls_to_try.insert(0, working_url)
+    session = get_session()
     last_err = ''
     for test_url in urls_to_try:
         for attempt in range(3):
             headers = {'User-Agent': user_agents[attempt % len(user_agents)]}
             try:
-                resp = requests.get(test_url, timeout=SCRAPE_TIMEOUT, headers=headers, allow_redirects=True)
-                if not resp.text.strip():
+                with session.get(test_url, timeout=SCRAPE_TIMEOUT, headers=headers, allow_redirects=True, stream=True) as resp:
+                    content_type = resp.headers.get('content-type', '').split(';')[0].strip().lower()
+                    if content_type and content_type not in TEXT_TYPES:
+                        last_err = f'unsupported content type: {content_type}'
+                        break
+                    html = read_html(resp)
+                if not html.strip():
                     continue
-                html = resp.text[:SCRAPE_CHUNK_SIZE]
-                soup = BeautifulSoup(html, 'html.parser')
-                phones = extract_phone_numbers(html, soup)
-                socials = extract_social_links(html, soup)
-                address = extract_address(soup)
+                if parse_pool is None:
+                    phones, socials, address = parse_html(html)
+                else:
+                    try:
+                        phones, socials, address = parse_pool.submit(parse_html, html).result()
+                    except BrokenProcessPool:
+                        phones, socials, address = parse_html(html)
                 result.update({
                     'phones': phones,
                     'social_links': socials,
                     'address': address,
                     'status': 'ok'
                 })
+                HOST_WORKING[clean_domain] = test_url
                 return result
             except Exception as e:
                 last_err = str(e)
@@ -133,10 +219,19 @@ def scrape_site(domain):
 
 def batch_scrape(websites, max_workers=MAX_WORKERS):
     results = []
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_url = {executor.submit(scrape_site, url): url for url in websites}
-        for future in tqdm(as_completed(future_to_url), total=len(websites), desc="Scraping"):
-            results.append(future.result())
+    system_getaddrinfo = socket.getaddrinfo
+    cached_getaddrinfo = lru_cache(maxsize=4096)(system_getaddrinfo)
+    socket.getaddrinfo = cached_getaddrinfo
+    try:
+        with ProcessPoolExecutor() as parse_pool:
+            parse_pool.submit(int).result()
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                future_to_url = {executor.submit(scrape_site, url, parse_pool): url for url in websites}
+                for future in tqdm(as_completed(future_to_url), total=len(websites), desc="Scraping"):
+                    results.append(future.result())
+    finally:
+        socket.getaddrinfo = system_getaddrinfo
+        cached_getaddrinfo.cache_clear()
     return results
 
 def analyze_results(results):
@@ -166,68 +261,123 @@ def prepare_data():
     if websites is None:
         websites = websites_df.iloc[:, 0].dropna().tolist()
     print(f"Scraping {len(websites)} websites...")
-    domains = [str(u).strip().replace('http://', '').replace('https://', '').strip('/') for u in websites]
+    domains = [normalize_domain(u) for u in websites]
     urls = [clean_url(u) for u in domains]
     t0 = time.time()
     scraped = batch_scrape(domains, max_workers=MAX_WORKERS)
     elapsed = time.time() - t0
     print(f"Scraping completed in {elapsed:.1f} seconds.")
     analyze_results(scraped)
-    scraped_df = pd.DataFrame(scraped)
-    merge_col = 'domain'
-    merged_df = companies_df.copy()
-    if merge_col not in merged_df.columns:
-        merged_df[merge_col] = merged_df.iloc[:, 0]
-    if merge_col not in scraped_df.columns:
-        scraped_df[merge_col] = scraped_df.iloc[:, 0]
-    final = merged_df.merge(scraped_df, on=merge_col, how='left', suffixes=('', '_scraped'))
+    scraped_by_domain = {r['domain']: r for r in scraped}
+    final = companies_df.copy()
+    if 'domain' not in final.columns:
+        final['domain'] = final.iloc[:, 0]
+    matches = final['domain'].map(scraped_by_domain.get)
     for f in ['phones', 'social_links', 'address', 'status', 'error']:
-        if f+'_scraped' in final.columns:
-            final[f] = final[f+'_scraped']
-            final.drop(columns=[f+'_scraped'], inplace=True)
+        if any(f in r for r in scraped):
+            final[f] = matches.map(lambda r: r.get(f) if r else None)
     final.to_json(COMPANY_PROFILES_JSON, orient='records', force_ascii=False)
     print(f"Data merged and saved to {COMPANY_PROFILES_JSON}")
 
 def string_similarity(a, b):
     if not a or not b:
         return 0
-    return SequenceMatcher(None, str(a).lower(), str(b).lower()).ratio()
-
-def best_match(query, profiles):
-    best_score = 0
-    best_profile = None
-    for profile in profiles:
-        score = 0
-        name_fields = ['company_commercial_name', 'company_legal_name', 'company_all_available_names', 'name', 'company_name']
-        for k in name_fields:
-            if query.get('name') and k in profile and profile[k]:
-                score += 2 * string_similarity(query['name'], profile[k])
-        if query.get('domain') and 'domain' in profile and profile['domain']:
-            score += 2 * string_similarity(query['domain'], profile['domain'])
-        if query.get('phone') and profile.get('phones'):
-            try:
-                score += max([string_similarity(query['phone'], p) for p in (profile['phones'] or [])] or [0])
-            except Exception:
-                pass
-        if query.get('facebook'):
-            social_links = profile.get('social_links', {})
-            if not isinstance(social_links, dict):
-                social_links = {}
-            fb_links = social_links.get('facebook', [])
-            if fb_links:
-                score += max([string_similarity(query['facebook'], link) for link in fb_links] or [0])
-        if score > best_score:
-            best_score = score
-            best_profile = profile
-    return best_profile, best_score
+    return fuzz.ratio(str(a).lower(), str(b).lower()) / 100
+
+def build_profile_index(profiles):
+    index = {
+        'names': [str(p[k]).lower() if p.get(k) else '' for p in profiles for k in NAME_FIELDS],
+        'domains': [str(p['domain']).lower() if p.get('domain') else '' for p in profiles],
+        'phone_values': [],
+        'phone_owners': [],
+        'facebook_values': [],
+        'facebook_owners': [],
+        'domain_index': {},
+        'phone_index': {},
+        'facebook_index': {},
+    }
+    for i, p in enumerate(profiles):
+        if p.get('domain'):
+            index['domain_index'].setdefault(index['domains'][i], i)
+        for phone in p.get('phones') or []:
+            if phone:
+                phone = str(phone).lower()
+                index['phone_values'].append(phone)
+                index['phone_owners'].append(i)
+                index['phone_index'].setdefault(phone, i)
+                index['phone_index'].setdefault(phone.lstrip('+'), i)
+        social_links = p.get('social_links', {})
+        if not isinstance(social_links, dict):
+            social_links = {}
+        for link in social_links.get('facebook') or []:
+            if link:
+                link = str(link).lower()
+                index['facebook_values'].append(link)
+                index['facebook_owners'].append(i)
+                index['facebook_index'].setdefault(link, i)
+    for field in ['phone', 'facebook']:
+        owners = np.asarray(index.pop(f'{field}_owners'), dtype=np.intp)
+        starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]]) if len(owners) else owners
+        index[f'{field}_starts'] = starts
+        index[f'{field}_profiles'] = owners[starts]
+    return index
+
+def exact_match(query, index):
+    if query.get('domain'):
+        i = index['domain_index'].get(str(query['domain']).strip().lower())
+        if i is not None:
+            return i
+    if query.get('phone'):
+        phone = str(query['phone']).strip()
+        for key in (phone, phone.lstrip('+'), re.sub(r'\D', '', phone)):
+            i = index['phone_index'].get(key)
+            if i is not None:
+                return i
+    if query.get('facebook'):
+        i = index['facebook_index'].get(str(query['facebook']).strip().lower())
+        if i is not None:
+            return i
+    return None
+
+def similarity_scores(value, choices):
+    scores = process.cdist([value], choices, scorer=fuzz.ratio, dtype=np.float32)
+    return scores[0] / 100
+
+def has_query_fields(query):
+    return any(query.get(k) for k in QUERY_FIELDS)
+
+def best_match(query, profiles, index=None):
+    if not has_query_fields(query) or not profiles:
+        return None, 0
+    if index is None:
+        index = build_profile_index(profiles)
+    exact = exact_match(query, index)
+    if exact is not None:
+        return profiles[exact], 100.0
+    query = {k: str(v).lower() for k, v in query.items() if v}
+    scores = np.zeros(len(profiles), dtype=np.float32)
+    if query.get('name'):
+        name_scores = similarity_scores(query['name'], index['names'])
+        scores += 2 * name_scores.reshape(len(profiles), len(NAME_FIELDS)).sum(axis=1)
+    if query.get('domain'):
+        scores += 2 * similarity_scores(query['domain'], index['domains'])
+    for field in ['phone', 'facebook']:
+        if query.get(field) and index[f'{field}_values']:
+            field_scores = similarity_scores(query[field], index[f'{field}_values'])
+            scores[index[f'{field}_profiles']] += np.maximum.reduceat(field_scores, index[f'{field}_starts'])
+    best = int(np.argmax(scores))
+    if scores[best] <= 0:
+        return None, 0
+    return profiles[best], float(scores[best])
 
 app = FastAPI(title="Company Profile API")
 
 @app.on_event("startup")
 def load_profiles():
-    global PROFILES
-    with open(COMPANY_PROFILES_JSON, 'r', encoding='utf-8') as f:
-        PROFILES = json.load(f)
+    global PROFILES, PROFILE_INDEX
+    with open(COMPANY_PROFILES_JSON, 'rb') as f:
+        PROFILES = orjson.loads(f.read())
+    PROFILE_INDEX = build_profile_index(PROFILES)
 
 @app.get("/company/search")
 def company_search(
@@ -237,7 +387,9 @@ def company_search(
     facebook: Optional[str] = Query(None)
 ):
     query = {"name": name, "domain": domain, "phone": phone, "facebook": facebook}
-    profile, score = best_match(query, PROFILES)
+    if not has_query_fields(query):
+        raise HTTPException(status_code=400, detail="Provide at least one of: name, domain, phone, facebook")
+    profile, score = best_match(query, PROFILES, PROFILE_INDEX)
     if profile:
         profile = dict(profile)
         profile['match_score'] = round(score, 3)
@@ -1,8 +1,10 @@
 import pytest
+import requests
+import main
 from fastapi.testclient import TestClient
 from main import (
-    app, clean_url, extract_phone_numbers, extract_social_links, extract_address,
-    analyze_results, string_similarity, best_match, scrape_site
+    app, clean_url, normalize_domain, extract_phone_numbers, extract_social_links, extract_address,
+    analyze_results, string_similarity, best_match, scrape_site, parse_html
 )
 from bs4 import BeautifulSoup
 
@@ -12,12 +14,23 @@ def test_clean_url_variants():
     assert clean_url("https://example.com") == "https://example.com"
     assert clean_url(" www.example.com ") == "https://www.example.com"
 
+def test_normalize_domain_variants():
+    assert normalize_domain("https://example.com/") == "example.com"
+    assert normalize_domain(" http://www.example.com ") == "www.example.com"
+    assert normalize_domain("example.com") == "example.com"
+
 def test_extract_phone_numbers_html():
     html = "Call us at <a href='tel:+14085551234'>+1 (408) 555-1234</a>"
     soup = BeautifulSoup(html, "html.parser")
     phones = extract_phone_numbers(html, soup)
     assert "+14085551234" in phones or "+14085551234" in "".join(phones)
 
+def test_extract_phone_numbers_text_candidates():
+    html = "<p>Office: (212) 555-0199 | Order #12125550199000 | Info 911-555-1234</p>"
+    soup = BeautifulSoup(html, "html.parser")
+    phones = extract_phone_numbers(html, soup)
+    assert phones == ["+12125550199"]
+
 def test_extract_social_links_html():
     html = '''
         <a href="https://facebook.com/testpage"></a>
@@ -43,6 +56,35 @@ def test_extract_address_html():
     addr = extract_address(soup)
     assert "456 Elm" in addr
 
+def test_extract_address_prefers_class_over_id():
+    html = '''
+        <div id="store-location">77 Id Road, Othertown</div>
+        <span class="addr-box main-Address">12 Class Avenue, Sometown</span>
+    '''
+    soup = BeautifulSoup(html, "html.parser")
+    assert extract_address(soup) == "12 Class Avenue, Sometown"
+
+    html = '<div class="location" id="address">77 Id Road, Othertown</div><div class="location">short</div>'
+    soup = BeautifulSoup(html, "html.parser")
+    assert extract_address(soup) == "77 Id Road, Othertown"
+
+def test_parse_html_matches_soup_extractors():
+    html = '''<html><body>
+        <a href="tel:+14085551234">Call</a> <a href="https://www.facebook.com/acme">fb</a>
+        <footer>99 Harbor Blvd <script>var x = 1;</script> Suite 5, <template>tmpl text</template>Port City</footer>
+    </body></html>'''
+    soup = BeautifulSoup(html, "lxml")
+    phones, socials, address = parse_html(html)
+    assert phones == extract_phone_numbers(html, soup)
+    assert socials == extract_social_links(html, soup)
+    assert address == extract_address(soup) == "99 Harbor Blvd Suite 5, Port City"
+    assert parse_html("") == ([], {}, None)
+
+def test_parse_html_accepts_xml_encoding_declaration():
+    html = '<?xml version="1.0" encoding="iso-8859-1"?><html><body><address>456 \u00c9lm Street, Somecity</address></body></html>'
+    assert parse_html(html)[2] == "456 \u00c9lm Street, Somecity"
+    assert extract_address(BeautifulSoup(html, "html.parser")) == "456 \u00c9lm Street, Somecity"
+
 
 def test_analyze_results():
     mock_results = [
@@ -77,6 +119,37 @@ def test_best_match_exact_and_fuzzy():
     prof, score = best_match(q, profiles)
     assert prof["domain"] == "abc.com" and score < 100.0 and score > 0
 
+def test_best_match_exact_index_normalizes_keys():
+    profiles = [
+        {"domain": "Abc.com", "phones": ["+14085551234"], "social_links": {"facebook": ["https://facebook.com/abc"]}},
+        {"domain": "xyz.com", "phones": [], "social_links": {}}
+    ]
+    prof, score = best_match({"domain": "ABC.com ", "phone": None}, profiles)
+    assert prof["domain"] == "Abc.com" and score == 100.0
+    prof, score = best_match({"phone": "14085551234"}, profiles)
+    assert prof["domain"] == "Abc.com" and score == 100.0
+    prof, score = best_match({"facebook": "https://Facebook.com/abc"}, profiles)
+    assert prof["domain"] == "Abc.com" and score == 100.0
+
+def test_best_match_takes_per_profile_max_over_phones_and_facebook():
+    profiles = [
+        {"domain": "a.com", "phones": ["+19998887777", "+14085551234"],
+         "social_links": {"facebook": ["https://facebook.com/zzz", "https://facebook.com/acmeco"]}},
+        {"domain": "b.com", "phones": [], "social_links": {}},
+        {"domain": "c.com", "phones": ["+12125550000"], "social_links": {"facebook": ["https://facebook.com/other"]}},
+    ]
+    q = {"phone": "+1408555123"}
+    prof, score = best_match(q, profiles)
+    assert prof["domain"] == "a.com"
+    assert score == pytest.approx(string_similarity("+1408555123", "+14085551234"), abs=1e-5)
+    q = {"phone": "+121255500"}
+    prof, score = best_match(q, profiles)
+    assert prof["domain"] == "c.com"
+    q = {"facebook": "https://facebook.com/acme"}
+    prof, score = best_match(q, profiles)
+    assert prof["domain"] == "a.com"
+    assert score == pytest.approx(string_similarity("https://facebook.com/acme", "https://facebook.com/acmeco"), abs=1e-5)
+
 @pytest.fixture
 def client():
     return TestClient(app)
@@ -105,25 +178,128 @@ def test_api_search_by_name_fuzzy(client):
     assert data.get("domain") == "abc.com"
     assert data.get("match_score") > 0
 
-def test_scrape_site_integration(monkeypatch):
+class FakeRaw:
+    def __init__(self, body):
+        self.body = body
+
+    def read(self, amt=None, decode_content=False):
+        return self.body[:amt]
+
+class FakeResponse:
+    def __init__(self, body=b"", content_type="text/html; charset=utf-8", status_code=200):
+        self.raw = FakeRaw(body)
+        self.headers = {"content-type": content_type}
+        self.status_code = status_code
+        self.encoding = "utf-8"
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class FakeSession:
+    def __init__(self, get=None, head=None):
+        self.calls = []
+        self._get = get or (lambda url: FakeResponse())
+        self._head = head or (lambda url: FakeResponse())
+
+    def get(self, url, *args, **kwargs):
+        self.calls.append(("GET", url))
+        return self._get(url)
+
+    def head(self, url, *args, **kwargs):
+        self.calls.append(("HEAD", url))
+        return self._head(url)
+
+@pytest.fixture
+def fake_session(monkeypatch):
+    def install(**handlers):
+        session = FakeSession(**handlers)
+        monkeypatch.setattr(main, "get_session", lambda: session)
+        monkeypatch.setattr(main, "HOST_WORKING", {})
+        monkeypatch.setattr(main.time, "sleep", lambda seconds: None)
+        return session
+    return install
+
+def test_scrape_site_integration(fake_session):
     """Test scrape_site returns expected structure for a domain with static content."""
-    def fake_requests_get(url, *args, **kwargs):
-        class R:
-            text = "<html><a href='tel:+14085551234'></a><a href='https://facebook.com/myfb'></a><footer>1 Test Address</footer></html>"
-        return R()
-    monkeypatch.setattr(requests, "get", fake_requests_get)
+    html = b"<html><a href='tel:+14085551234'></a><a href='https://facebook.com/myfb'></a><footer>1 Test Address Lane</footer></html>"
+    session = fake_session(get=lambda url: FakeResponse(html))
     result = scrape_site("abc.com")
     assert result['status'] == 'ok'
     assert "+14085551234" in result['phones']
     assert "facebook" in result['social_links']
     assert "Test Address" in result['address']
+    assert ("GET", "https://abc.com") in session.calls
 
-def test_scrape_site_failure(monkeypatch):
+def test_scrape_site_failure(fake_session):
     """Test scrape_site handles exceptions gracefully."""
-    def fake_requests_get(url, *args, **kwargs):
-        raise Exception("Failed to connect")
-    monkeypatch.setattr(requests, "get", fake_requests_get)
+    def fail(url):
+        raise requests.ConnectionError("Failed to connect")
+    fake_session(get=fail)
     result = scrape_site("bad.com")
     assert result['status'] == 'fail'
     assert "error" in result
 
+def test_scrape_site_skips_non_html_variants(fake_session):
+    def get(url):
+        if url == "https://abc.com":
+            return FakeResponse(b"%PDF-1.7", content_type="Application/PDF; name=x")
+        return FakeResponse(b"<footer>1 Test Address Lane</footer>")
+    session = fake_session(get=get)
+    result = scrape_site("abc.com")
+    assert result['status'] == 'ok'
+    assert session.calls == [("GET", "https://abc.com"), ("GET", "http://abc.com")]
+
+def test_scrape_site_sends_no_head_requests(fake_session):
+    def timeout(url):
+        raise requests.Timeout("timed out")
+    session = fake_session(get=timeout, head=timeout)
+    result = scrape_site("dead.com")
+    assert result['status'] == 'fail'
+    assert len(session.calls) == 12
+    assert all(method == "GET" for method, url in session.calls)
+
+def test_scrape_site_parses_inline_when_pool_is_broken(fake_session):
+    class BrokenPool:
+        def submit(self, fn, *args):
+            raise main.BrokenProcessPool("worker died")
+    fake_session(get=lambda url: FakeResponse(b"<footer>1 Test Address Lane</footer>"))
+    result = scrape_site("abc.com", BrokenPool())
+    assert result['status'] == 'ok'
+    assert result['address'] == "1 Test Address Lane"
+
+def test_batch_scrape_scopes_dns_cache_to_the_batch(monkeypatch):
+    lookups = []
+    def fake_getaddrinfo(*args, **kwargs):
+        lookups.append(args)
+        return []
+    def fake_scrape_site(domain, parse_pool=None):
+        main.socket.getaddrinfo("abc.com", 443)
+        main.socket.getaddrinfo("abc.com", 443)
+        return {'domain': domain}
+    monkeypatch.setattr(main.socket, "getaddrinfo", fake_getaddrinfo)
+    monkeypatch.setattr(main, "scrape_site", fake_scrape_site)
+    main.batch_scrape(["abc.com"], max_workers=1)
+    assert lookups == [("abc.com", 443)]
+    assert main.socket.getaddrinfo is fake_getaddrinfo
+    main.batch_scrape(["abc.com"], max_workers=1)
+    assert len(lookups) == 2
+
+def test_scrape_site_reads_at_most_chunk_size(fake_session, monkeypatch):
+    body = b"<p>Call 212-555-0199</p>" + b"x" * main.SCRAPE_CHUNK_SIZE + b"<p>Call 408-555-1234</p>"
+    assert len(main.read_html(FakeResponse(body))) == main.SCRAPE_CHUNK_SIZE
+    seen = []
+    def recording_parse_html(html):
+        seen.append(html)
+        return parse_html(html)
+    monkeypatch.setattr(main, "parse_html", recording_parse_html)
+    fake_session(get=lambda url: FakeResponse(body))
+    result = scrape_site("abc.com")
+    assert result['status'] == 'ok'
+    assert len(seen[0]) == main.SCRAPE_CHUNK_SIZE
+    assert result['phones'] == ["+12125550199"]